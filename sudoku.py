@@ -1,43 +1,82 @@
+import sys
 from typing import List
-from typing import Set
-from typing import Dict
+from typing import Deque
 from typing import Tuple
-from copy import deepcopy
+from collections import deque
+from itertools import islice
 
 
-def find_neighbors(row: int, col: int) -> Tuple[Set, List[Set]]:
-    """Maps a coordinate in a Sudoku grid to that coordinate's neighbors and its neighborhoods.
+def find_neighbors(index: int) -> Tuple[int, ...]:
+    """Maps the index of a square in a Sudoku grid to the indices of that square's neighbors.
 
+    The square at (row, col) has the index row * 9 + col.
     Neighbors of a square are the squares in the grid that share a neighborhood with the specified square.
     A neighborhood is a set of squares that are in the same row, same column, or same block.
     """
+    row, col = divmod(index, 9)
     neighbors = set()
-    # first set is the same-row neighborhood
-    # second set is the same-column neighborhood
-    # third set is the same-block neighborhood
-    neighborhoods = [set(), set(), set()]
     for i in range(9):
         if i != col:
             # add neighbors in the same row
-            neighbors.add((row, i))
-            neighborhoods[0].add((row, i))
+            neighbors.add(row * 9 + i)
         if i != row:
             # add neighbors in the same column
-            neighbors.add((i, col))
-            neighborhoods[1].add((i, col))
+            neighbors.add(i * 9 + col)
     # find the bounds of the 3x3 block neighborhood
     row_low_limit = (row // 3) * 3
     col_low_limit = (col // 3) * 3
     for i in range(row_low_limit, row_low_limit + 3):
         for j in range(col_low_limit, col_low_limit + 3):
             if (i, j) != (row, col):
-                neighborhoods[2].add((i, j))
-                neighbors.add((i, j))
-    return neighbors, neighborhoods
+                neighbors.add(i * 9 + j)
+    return tuple(sorted(neighbors))
 
 
-# Calculates all the coordinates in a 9 by 9 grid
-all_row_col_combinations = [(row, col) for row in range(9) for col in range(9)]
+def find_units(index: int) -> Tuple[Tuple[int, int, Tuple[int, ...]], ...]:
+    """Maps the index of a square in a Sudoku grid to the row, column and block units that contain it.
+
+    For each of its three units, the square is mapped to the unit number (see UNIT_SQUARES), the bit marking the
+    square's position in the unit, and the indices of the unit's squares.
+    """
+    row, col = divmod(index, 9)
+    block = (row // 3) * 3 + col // 3
+    units = []
+    for unit in (row, 9 + col, 18 + block):
+        unit_squares = UNIT_SQUARES[unit]
+        units.append((unit, 1 << unit_squares.index(index), unit_squares))
+    return tuple(units)
+
+
+# ASCII characters that are stripped from raw text and the characters allowed to remain
+WHITESPACE = b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+DIGITS = b"0123456789"
+# Translation tables between the characters '0' to '9' and the digit values 0 to 9
+DIGIT_VALUES = bytes.maketrans(DIGITS, bytes(range(10)))
+DIGIT_CHARACTERS = bytes.maketrans(bytes(range(10)), DIGITS)
+
+# Bitmask with bits 0 through 8 set, marking every digit from '1' to '9' as possible
+ALL_DIGITS = 0x1FF
+
+# Layout of the possibilities list (see Sudoku.generate_initial_possibilities): one bitmask per square, followed by
+# one bitmask per digit in each of the 27 units
+SQUARE_COUNT = 81
+UNIT_PLACES_OFFSET = SQUARE_COUNT
+CONSTRAINT_COUNT = UNIT_PLACES_OFFSET + 27 * 9
+
+# The squares of each unit, indexed by unit number. Units are numbered 0 to 8 for rows, 9 to 17 for columns and 18 to 26
+# for blocks, and the squares of a unit are ordered by their position in it
+UNIT_SQUARES = (tuple(tuple(row * 9 + i for i in range(9)) for row in range(9))
+                + tuple(tuple(i * 9 + col for i in range(9)) for col in range(9))
+                + tuple(tuple(((block // 3) * 3 + i // 3) * 9 + (block % 3) * 3 + i % 3 for i in range(9))
+                        for block in range(9)))
+
+# The neighbors of each square in a Sudoku grid, indexed by row * 9 + col
+NEIGHBORS = tuple(find_neighbors(index) for index in range(SQUARE_COUNT))
+# The units of each square, indexed by row * 9 + col. Each unit is given as the index in the possibilities where its
+# places for the digit '1' are kept, the bit marking the square's position in it, and the indices of its squares
+UNITS = tuple(tuple((UNIT_PLACES_OFFSET + unit * 9, position_bit, unit_squares)
+                    for unit, position_bit, unit_squares in find_units(index))
+              for index in range(SQUARE_COUNT))
 
 
 class Sudoku(object):
@@ -54,14 +93,7 @@ class Sudoku(object):
 
     def __repr__(self):
         """Returns the current state of the Sudoku"""
-        grid_digits = []
-        for row in range(9):
-            for col in range(9):
-                if (row, col) not in self.sudoku:
-                    grid_digits.append("0")
-                else:
-                    grid_digits.append(self.sudoku[(row, col)])
-        grid_output = "".join(grid_digits)
+        grid_output = self.sudoku.translate(DIGIT_CHARACTERS).decode("ascii")
         sudoku_output = "Sudoku(raw_text=\"{}\")>".format(grid_output)
         return sudoku_output
 
@@ -70,15 +102,8 @@ class Sudoku(object):
 
         '0' represents an unsolved square
         """
-        grid_digits = []
-        for row in range(9):
-            for col in range(9):
-                if (row, col) not in self.sudoku:
-                    grid_digits.append("0")
-                else:
-                    grid_digits.append(self.sudoku[(row, col)])
-            grid_digits.append("\n")
-        grid_output = "".join(grid_digits)
+        grid_digits = self.sudoku.translate(DIGIT_CHARACTERS).decode("ascii")
+        grid_output = "\n".join([grid_digits[row_start:row_start + 9] for row_start in range(0, 81, 9)]) + "\n"
         return grid_output
 
     def __init__(self, raw_text: str):
@@ -92,151 +117,206 @@ class Sudoku(object):
 
         Raises ValueError if raw_text does not contain only 81 digits and whitespace
         """
-        # remove all whitespace
-        sudoku_text = "".join(raw_text.split())
-        # input should have 81 characters that are only from '0' to '9'
-        if not sudoku_text.isdecimal():
-            raise ValueError("Non-whitespace characters in input should only be characters from '0' to '9'")
-        try:
-            sudoku_text.encode("ascii")
-        except UnicodeEncodeError:
+        # remove all whitespace, turning any non-ASCII character into a '?' that will fail the digit check below
+        sudoku_bytes = raw_text.encode("ascii", "replace").translate(None, WHITESPACE)
+        # input should have 81 characters that are only from '0' to '9', so nothing is left once digits are deleted
+        if sudoku_bytes.translate(None, DIGITS):
             raise ValueError("Non-whitespace characters in input should only be characters from '0' to '9'")
-        if len(sudoku_text) != 81:
+        if len(sudoku_bytes) != 81:
             raise ValueError("Input should have 81 non-whitespace characters")
-        return sudoku_text
+        return sudoku_bytes.decode("ascii")
 
     @staticmethod
-    def parse_sudoku_text(sudoku_text: str) -> Dict[Tuple, str]:
-        """Parses a textual representation of a Sudoku grid into this class's canonical representation"""
-        sudoku = {}
-        for row_index in range(9):
-            for col_index in range(9):
-                current_digit = sudoku_text[row_index * 9 + col_index]
-                if current_digit != "0":
-                    sudoku[(row_index, col_index)] = current_digit
-        return sudoku
+    def parse_sudoku_text(sudoku_text: str) -> bytearray:
+        """Parses a textual representation of a Sudoku grid into this class's canonical representation
+
+        The canonical representation is a bytearray of 81 digits in which the square at (row, col) is stored at index
+        row * 9 + col, holding 0 if the square is unsolved or its digit from 1 to 9 otherwise.
+        """
+        return bytearray(sudoku_text, "ascii").translate(DIGIT_VALUES)
 
     def solve(self):
         """Solve the Sudoku"""
         if Sudoku.is_solved(self.sudoku):
             return
         possibilities = Sudoku.generate_initial_possibilities()
-        # More squares will be filled in as we assign each hinted square and deduce the other squares, and
-        # more keys will be added to self.sudoku. We can't iterate through an iterable that changes, so copy the keys
-        # of the hinted squares and iterate through the copy.
-        keys = set(self.sudoku.keys())
-        for square in keys:
-            # Place the hinted digits in their squares and deduce the digits of the other squares
-            Sudoku.assign(square[0], square[1], self.sudoku[square], possibilities, self.sudoku)
-
-        # If the Sudoku can't be solved with pure deduction, guess some digits and see which one works
+        # Place the hinted digits in their squares by eliminating every other digit from them, and deduce the digits of
+        # the other squares. More squares will be filled in self.sudoku along the way, so the eliminations are all
+        # queued up before propagating any of them.
+        eliminations = deque((square, ALL_DIGITS & ~(1 << (digit - 1))) for square, digit in enumerate(self.sudoku)
+                             if digit)
+        Sudoku.propagate(eliminations, possibilities, self.sudoku)
+
+        # If the Sudoku can't be solved with pure deduction, guess some digits and see which one works. search tries its
+        # last guesses in place, so hand it a copy and only keep the result if a solution is found.
         if not Sudoku.is_solved(self.sudoku):
-            self.sudoku = self.search(possibilities, self.sudoku)
+            try:
+                self.sudoku = self.search(possibilities, self.sudoku.copy())
+            except ValueError as error:
+                raise ValueError("Exhausted possibilities - every guess ended in a contradiction") from error
 
     @staticmethod
-    def generate_initial_possibilities() -> List[List[Set[str]]]:
-        """Create a 2-dimensional array in which each element is a set of digits from '1' to '9'"""
-        all_possibilities = {"1", "2", "3", "4", "5", "6", "7", "8", "9"}
-        possibilities = [[] for _ in range(9)]
-        for row_index in range(9):
-            for col_index in range(9):
-                possibilities[row_index].append(all_possibilities.copy())
-        return possibilities
+    def generate_initial_possibilities() -> List[int]:
+        """Create a flat list of CONSTRAINT_COUNT (324) bitmasks tracking where each digit can still go in the grid
+
+        The first SQUARE_COUNT (81) bitmasks hold the possibilities of each square, in which bits 0 to 8 stand for the
+        digits '1' to '9'. The square at (row, col) is stored at index row * 9 + col.
+        The other 243 bitmasks hold the places left for each digit in each of the 27 units of the grid (see
+        UNIT_SQUARES), in which bits 0 to 8 stand for the squares of the unit. The places for the digit d in unit u are
+        stored at index UNIT_PLACES_OFFSET + u * 9 + d - 1.
+        """
+        return [ALL_DIGITS] * CONSTRAINT_COUNT
 
     @staticmethod
-    def assign(row, col, digit_to_assign: str, possibilities: List[List[Set[str]]], solution: Dict[Tuple, str]):
-        """Assign element to the solution at the specified row and col and eliminate other possibilities."""
-        # assign the digit as the solution
-        solution[(row, col)] = digit_to_assign
-        # eliminate the rest of the digits from possibilities
-        digits_to_discard = possibilities[row][col].difference({digit_to_assign})
-        for digit in digits_to_discard:
-            Sudoku.eliminate(row, col, digit, possibilities, solution)
+    def assign(index: int, digit_to_assign: int, possibilities: List[int], solution: bytearray):
+        """Assign element to the solution at the specified square index and eliminate other possibilities."""
+        # eliminate the rest of the digits from possibilities, which records the digit as the solution once it's the
+        # only one left
+        eliminations = deque([(index, possibilities[index] & ~(1 << (digit_to_assign - 1)))])
+        Sudoku.propagate(eliminations, possibilities, solution)
 
     @staticmethod
-    def eliminate(row, col, digit: str, possibilities: List[List[Set[str]]], solution: Dict[Tuple, str]):
-        """Eliminate the specified digit from the possibilities in the specified square.
+    def propagate(eliminations: Deque[Tuple[int, int]], possibilities: List[int], solution: bytearray):
+        """Eliminate each (square index, digit bits) pair in eliminations from the possibilities until none are left.
 
-        This method also propagates the effect of eliminating this digit from the possibilities in the square
+        Each pair holds a bitmask of the digits to eliminate from the square at that index. Eliminating a digit can lead
+        to deducing other eliminations, which are queued onto eliminations rather than made recursively, so propagation
+        doesn't pay for a Python call per deduction or run into the recursion limit.
         """
-        # element was already discarded from possibilities[row][col
-        if digit not in possibilities[row][col]:
-            return
+        # bind the queue's methods once, since they're called for every elimination
+        popleft = eliminations.popleft
+        append = eliminations.append
+        while eliminations:
+            index, digit_bits = popleft()
+            # skip the digits that were already discarded from possibilities[index]
+            digit_bits &= possibilities[index]
+            if not digit_bits:
+                continue
 
-        possibilities[row][col].discard(digit)
-
-        # A contradiction occurred if there are no more possibilities for this square
-        if len(possibilities[row][col]) == 0:
-            raise ValueError("Contradiction at ({}, {}) - no more possibilities".format(row, col))
-
-        neighbors, neighborhoods = Sudoku.neighbors[(row, col)]
-
-        # If this square must contain the leftover digit , eliminate this digit from this square's neighbors
-        if len(possibilities[row][col]) == 1:
-            for neighbor in neighbors:
-                Sudoku.eliminate(neighbor[0], neighbor[1], min(possibilities[row][col]), possibilities, solution)
-
-        # In each of the neighborhoods of this square, check if there's a square that must necessarily contain
-        # the digit just eliminated from this square.
-        for neighborhood in neighborhoods:
-            possible_squares_for_digit = []
-            for neighbor_row, neighbor_col in neighborhood:
-                if digit in possibilities[neighbor_row][neighbor_col]:
-                    possible_squares_for_digit.append((neighbor_row, neighbor_col))
-            # a contradiction has occurred if no one else in the neighborhood could have this digit
-            if len(possible_squares_for_digit) == 0:
-                raise ValueError("Contradiction at ({}, {}) - '{}' cannot be in neighborhood {}".format(row, col, digit,
-                                                                                                        neighborhood))
-            # if only one other square in the neighborhood can contain the digit, then that square must contain it
-            if len(possible_squares_for_digit) == 1:
-                square_for_digit = possible_squares_for_digit[0]
-                solution[square_for_digit] = digit
-                Sudoku.assign(*square_for_digit, digit, possibilities, solution)
+            remaining = possibilities[index] ^ digit_bits
+            possibilities[index] = remaining
+
+            # A contradiction occurred if there are no more possibilities for this square
+            if remaining == 0:
+                raise ValueError("Contradiction at ({}, {}) - no more possibilities".format(*divmod(index, 9)))
+
+            # If this square must contain the leftover digit , record it as solved and eliminate this digit from this
+            # square's neighbors
+            if remaining & (remaining - 1) == 0:
+                solution[index] = remaining.bit_length()
+                for neighbor in NEIGHBORS[index]:
+                    if possibilities[neighbor] & remaining:
+                        append((neighbor, remaining))
+
+            # In each of the units of this square, remove this square from the places left for the digits just
+            # eliminated from it, and check if there's a square that must necessarily contain one of those digits.
+            while digit_bits:
+                digit_bit = digit_bits & -digit_bits
+                digit_bits ^= digit_bit
+                digit_index = digit_bit.bit_length() - 1
+                for places_index, position_bit, unit_squares in UNITS[index]:
+                    places_index += digit_index
+                    places = possibilities[places_index] ^ position_bit
+                    possibilities[places_index] = places
+                    # a contradiction has occurred if no one else in the unit could have this digit
+                    if places == 0:
+                        raise ValueError("Contradiction at ({}, {}) - '{}' cannot be in neighborhood {}".format(
+                            *divmod(index, 9), digit_index + 1, [divmod(square, 9) for square in unit_squares]))
+                    # if only one other square in the unit can contain the digit, then that square must contain it,
+                    # so queue the elimination of its other digits unless that has been done already
+                    if places & (places - 1) == 0:
+                        square_for_digit = unit_squares[places.bit_length() - 1]
+                        if possibilities[square_for_digit] != digit_bit:
+                            append((square_for_digit, possibilities[square_for_digit] & ~digit_bit))
 
     @staticmethod
-    def search(possibilities, solution: Dict[Tuple, str]):
+    def search(possibilities: List[int], solution: bytearray):
         """Enumerate the possibilities of the Sudoku until a successful solution is found"""
         # If the Sudoku is solved, return it
         if Sudoku.is_solved(solution):
             return solution
 
-        most_deducted_square = Sudoku.get_square_with_least_possibilities(possibilities, solution)
-        most_deducted_square_possibilities = possibilities[most_deducted_square[0]][most_deducted_square[1]].copy()
-        # For each possibility for this square...
-        for possibility in most_deducted_square_possibilities:
+        most_deducted_constraint = Sudoku.get_constraint_with_least_possibilities(possibilities)
+        remaining = possibilities[most_deducted_constraint]
+        # For each possibility for this constraint but the last...
+        while remaining & (remaining - 1):
+            possibility_bit = remaining & -remaining
+            remaining ^= possibility_bit
             try:
-                solution_copy = deepcopy(solution)
-                possibilities_copy = deepcopy(possibilities)
+                # Both hold only ints, so shallow copies are enough to branch the state
+                solution_copy = solution.copy()
+                possibilities_copy = possibilities[:]
 
                 # ...assign the possibility and eliminate the other possibilities
-                Sudoku.assign(most_deducted_square[0], most_deducted_square[1], possibility, possibilities_copy,
-                              solution_copy)
+                square, digit = Sudoku.get_assignment(most_deducted_constraint, possibility_bit)
+                Sudoku.assign(square, digit, possibilities_copy, solution_copy)
                 return Sudoku.search(possibilities_copy, solution_copy)
             except ValueError:
                 # If a contradiction has occurred, move on and try the next possibility
                 continue
-        # This will only get raised if all the possibilities of a square have been tried and all of them have ended in
-        # contradictions in the process of solving them
-        raise ValueError("Exhausted possibilities at ({}, {})".format(*most_deducted_square))
+        # The last possibility is tried without copying the state, since nothing is left to try with it afterwards.
+        # If a contradiction occurs from here on, all the possibilities of this constraint have been exhausted and the
+        # ValueError propagates to the caller, which tries its own next possibility on its own copy of the state.
+        square, digit = Sudoku.get_assignment(most_deducted_constraint, remaining)
+        Sudoku.assign(square, digit, possibilities, solution)
+        return Sudoku.search(possibilities, solution)
 
     @staticmethod
-    def get_square_with_least_possibilities(possibilities, solution: Dict[Tuple, str]):
-        """Finds the unsolved square with the least remaining possibilities"""
-        square_least_possibilities = tuple()
-        # An unsolved square will have at most 9 possibilities,
+    def get_constraint_with_least_possibilities(possibilities: List[int]) -> int:
+        """Finds the index of the unsatisfied constraint with the least remaining possibilities
+
+        Each bitmask in the possibilities is a constraint: a square must hold one of the digits left in its bitmask,
+        and a digit must go in one of the places left for it in a unit. Guessing on whichever of them has the fewest
+        possibilities left keeps the search tree narrow.
+        """
+        constraint_least_possibilities = -1
+        # An unsatisfied constraint will have at most 9 possibilities,
         # so set the initial least_possibilities to be greater than 9
         least_possibilities = 10
-        for row in range(9):
-            for col in range(9):
-                if (row, col) not in solution and len(possibilities[row][col]) < least_possibilities:
-                    square_least_possibilities = (row, col)
-                    least_possibilities = len(possibilities[row][col])
-        return square_least_possibilities
+        for index, constraint_possibilities in enumerate(possibilities):
+            # A constraint left with a single possibility has been satisfied by propagation
+            if constraint_possibilities & (constraint_possibilities - 1) == 0:
+                continue
+            possibility_count = constraint_possibilities.bit_count()
+            if possibility_count < least_possibilities:
+                # An unsatisfied constraint has at least 2 possibilities, so the first one found with 2 can't be beaten
+                if possibility_count == 2:
+                    return index
+                constraint_least_possibilities = index
+                least_possibilities = possibility_count
+        return constraint_least_possibilities
+
+    @staticmethod
+    def get_assignment(constraint: int, possibility_bit: int) -> Tuple[int, int]:
+        """Maps one of the possibilities of a constraint to the square index and digit it assigns"""
+        if constraint < SQUARE_COUNT:
+            # the possibilities of a square are its digits
+            return constraint, possibility_bit.bit_length()
+        # the possibilities of a digit in a unit are the places in the unit
+        unit, digit_index = divmod(constraint - UNIT_PLACES_OFFSET, 9)
+        return UNIT_SQUARES[unit][possibility_bit.bit_length() - 1], digit_index + 1
 
     @staticmethod
-    def is_solved(sudoku: Dict[Tuple, str]):
+    def is_solved(sudoku: bytearray):
         """Determines if the Sudoku is solved"""
-        return len(sudoku) == 81
+        return 0 not in sudoku
+
 
-    # Stores the neighbors and neighborhoods of a given coordinate in a Sudoku grid
-    neighbors = {key: find_neighbors(*key) for key in all_row_col_combinations}
+def main():
+    """Solves every Sudoku in the file named by the first command line argument and prints the solutions.
+
+    The file is laid out like Project Euler's Problem 96: each Sudoku is given as a line identifying it followed by
+    nine lines of nine digits, with '0' marking an unsolved square.
+    """
+    write = sys.stdout.write
+    with open(sys.argv[1], "r") as sudoku_file:
+        # Stream the file one Sudoku at a time, so large collections of grids don't have to fit in memory
+        for sudoku_id in sudoku_file:
+            sudoku = Sudoku(raw_text="".join(islice(sudoku_file, 9)))
+            sudoku.solve()
+            write(sudoku_id)
+            write(str(sudoku))
+
+
+if __name__ == "__main__":
+    main()
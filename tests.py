@@ -1,4 +1,8 @@
 from sudoku import Sudoku
+from sudoku import main
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
 import unittest
 
 
@@ -22,8 +26,56 @@ class TestSudoku(unittest.TestCase):
 
                 sudoku_solver.solve()
 
-                first_three_digits = sudoku_solver.sudoku[(0, 0)] + sudoku_solver.sudoku[(0, 1)] + sudoku_solver.sudoku[(0, 2)]
-                three_digit_number = int(first_three_digits)
+                three_digit_number = (sudoku_solver.sudoku[0] * 100 + sudoku_solver.sudoku[1] * 10
+                                      + sudoku_solver.sudoku[2])
                 sum_of_first_three_digits += three_digit_number
 
             self.assertEqual(24702, sum_of_first_three_digits)
+
+    def test_solve_hard_sudoku(self):
+        """Verifies that Sudoku.solve() completes a grid that needs many guesses without changing its clues.
+
+        Every row, column and 3x3 block of the solution must hold each digit from 1 to 9 exactly once.
+        """
+        raw_text = "000006000059000008200008000045000000003000000006003054000325006000000000000000000"
+        sudoku_solver = Sudoku(raw_text=raw_text)
+
+        sudoku_solver.solve()
+
+        for index, clue in enumerate(raw_text):
+            if clue != "0":
+                self.assertEqual(int(clue), sudoku_solver.sudoku[index])
+        rows = [[row * 9 + col for col in range(9)] for row in range(9)]
+        cols = [[row * 9 + col for row in range(9)] for col in range(9)]
+        blocks = [[(block // 3 * 3 + i // 3) * 9 + block % 3 * 3 + i % 3 for i in range(9)] for block in range(9)]
+        for unit in rows + cols + blocks:
+            self.assertEqual(set(range(1, 10)), {sudoku_solver.sudoku[index] for index in unit})
+
+    def test_solve_unsolvable_sudoku(self):
+        """Verifies that Sudoku.solve() raises ValueError for a grid whose clues don't conflict but have no solution."""
+        raw_text = "102400000009120406400009000000040000600000000845697002030000000000001000070908030"
+        sudoku_solver = Sudoku(raw_text=raw_text)
+
+        with self.assertRaises(ValueError):
+            sudoku_solver.solve()
+
+    def test_main_prints_solutions(self):
+        """Verifies that main() prints every Sudoku in testcases.txt as its identifier followed by its solved grid.
+
+        Reads the 50 solutions back from the output and checks them with the same sum as in Project Euler's Problem 96.
+        """
+        output = StringIO()
+        with mock.patch("sys.argv", ["sudoku.py", "testcases.txt"]), redirect_stdout(output):
+            main()
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(50 * 10, len(lines))
+        sum_of_first_three_digits = 0
+        for grid_start in range(0, len(lines), 10):
+            self.assertEqual("Grid {:02d}".format(grid_start // 10 + 1), lines[grid_start])
+            rows = lines[grid_start + 1:grid_start + 10]
+            for row in rows:
+                self.assertRegex(row, "^[1-9]{9}$")
+            sum_of_first_three_digits += int(rows[0][:3])
+
+        self.assertEqual(24702, sum_of_first_three_digits)